@@ -7,26 +7,131 @@ for detecting pneumonia from chest X-ray images.
 import os
 import numpy as np
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from werkzeug.utils import secure_filename
 import tensorflow as tf
 from PIL import Image
 import io
+import queue
+import threading
+import time
+import hashlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 import logging
 
+from utils import format_prediction_responses
+
+# Optional C-accelerated JSON serialization
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# SIMD-accelerated base64 (drop-in replacement for the stdlib module)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# Optional libjpeg-turbo / OpenCV fast decode path for JPEG uploads
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+# Optional streaming JSON parser for large base64 payloads
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Optional JIT-compiled normalization kernel
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Optional fast hashing for the prediction cache (falls back to BLAKE2)
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# Standalone LiteRT interpreter for INFERENCE_BACKEND=tflite; tf.lite.Interpreter
+# is deprecated for removal but kept as the fallback
+try:
+    from ai_edge_litert.interpreter import Interpreter as TFLiteInterpreter
+except ImportError:
+    TFLiteInterpreter = None
+
+# Optional TensorRT acceleration (NVIDIA GPUs only)
+try:
+    import tensorrt as trt
+    import pycuda.driver as cuda
+    cuda.init()
+except Exception:
+    trt = None
+    cuda = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (floats and numpy values serialized in C)"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 # Initialize Flask app
 app = Flask(__name__)
+if orjson is not None:
+    app.json = ORJSONProvider(app)
 
 # Configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp'})
+# Leading bytes identifying each supported format
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG', 'png'),
+    (b'GIF8', 'gif'),
+    (b'BM', 'bmp'),
+)
 IMG_SIZE = 224
 THRESHOLD = 0.5  # Classification threshold (adjustable)
+MAX_BATCH_SIZE = 32  # Largest batch a single inference call will see
+MAX_BATCH_WAIT = 0.01  # Seconds the batcher waits for more requests to fill a batch
+PREDICTION_TIMEOUT = 30  # Seconds a request waits for its batched prediction
+PREDICTION_CACHE_SIZE = 4096  # Number of image hashes whose predictions are kept
+TIMESTAMP_RESOLUTION = 0.1  # Seconds a formatted response timestamp is reused
+
+# BILINEAR (PIL) / INTER_AREA (OpenCV) are accurate enough for the CNN and much
+# cheaper than LANCZOS; set HIGH_QUALITY_RESIZE=1 to restore PIL LANCZOS
+# resampling for every upload (this bypasses the OpenCV decode path)
+HIGH_QUALITY_RESIZE = os.environ.get('HIGH_QUALITY_RESIZE', '0') == '1'
+RESAMPLE_FILTER = Image.Resampling.LANCZOS if HIGH_QUALITY_RESIZE else Image.Resampling.BILINEAR
+
+# Inference backend: 'auto' (TensorRT when available, else Keras), 'keras',
+# 'tensorrt' or 'tflite' (INT8 post-training quantization for CPU deployments)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'auto').lower()
+# Run the Keras model in mixed_float16 when a GPU is present
+MIXED_PRECISION = os.environ.get('MIXED_PRECISION', '1') == '1'
+# Compile the Keras forward pass with XLA (fuses conv+BN+ReLU sequences)
+XLA_COMPILE = os.environ.get('XLA_COMPILE', '1') == '1'
+INPUT_DTYPE = np.float32  # dtype produced by preprocess_image (float16/uint8 for other backends)
 
 # Create uploads folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -36,8 +141,226 @@ MODEL_PATH = 'pneumonia_model.keras'
 # Load the trained model
 MODEL_PATH = 'pneumonia_model.keras'
 
-def load_model_safe():
-    """Safely load model with multiple fallback strategies"""
+ONNX_PATH = 'pneumonia.onnx'
+ENGINE_PATH = 'pneumonia.engine'
+TFLITE_PATH = 'pneumonia_int8.tflite'
+CALIBRATION_DIR = os.environ.get('CALIBRATION_DIR', 'test_images')  # Representative images for INT8 calibration
+
+
+class TensorRTModel:
+    """
+    Runs a serialized TensorRT engine behind a Keras-like predict() method
+
+    Pinned host and device buffers are allocated once for MAX_BATCH_SIZE
+    images and reused for every call on a single CUDA stream, so uploads
+    are true async DMA transfers without per-request allocations.
+    """
+
+    def __init__(self, engine_bytes, keras_model):
+        self.keras_model = keras_model
+        self._lock = threading.Lock()
+        # Share TensorFlow's primary context instead of creating a second one
+        self._cuda_ctx = cuda.Device(0).retain_primary_context()
+        self._cuda_ctx.push()
+        try:
+            trt_logger = trt.Logger(trt.Logger.WARNING)
+            self.engine = trt.Runtime(trt_logger).deserialize_cuda_engine(engine_bytes)
+            if self.engine is None:
+                raise RuntimeError("Failed to deserialize TensorRT engine")
+            self.context = self.engine.create_execution_context()
+            
+            names = [self.engine.get_tensor_name(i) for i in range(self.engine.num_io_tensors)]
+            self.input_name = next(n for n in names
+                                   if self.engine.get_tensor_mode(n) == trt.TensorIOMode.INPUT)
+            self.output_name = next(n for n in names
+                                    if self.engine.get_tensor_mode(n) == trt.TensorIOMode.OUTPUT)
+            
+            self.stream = cuda.Stream()
+            self.h_input = cuda.pagelocked_empty((MAX_BATCH_SIZE, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+            self.h_output = cuda.pagelocked_empty((MAX_BATCH_SIZE, 1), dtype=np.float32)
+            self.d_input = cuda.mem_alloc(self.h_input.nbytes)
+            self.d_output = cuda.mem_alloc(self.h_output.nbytes)
+            self.context.set_tensor_address(self.input_name, int(self.d_input))
+            self.context.set_tensor_address(self.output_name, int(self.d_output))
+        finally:
+            self._cuda_ctx.pop()
+
+    def count_params(self):
+        return self.keras_model.count_params()
+
+    def predict(self, x, verbose=0):
+        """Run inference on a (N, IMG_SIZE, IMG_SIZE, 3) float32 batch"""
+        outputs = []
+        
+        with self._lock:
+            self._cuda_ctx.push()
+            try:
+                for start in range(0, len(x), MAX_BATCH_SIZE):
+                    chunk = x[start:start + MAX_BATCH_SIZE]
+                    n = len(chunk)
+                    self.h_input[:n] = chunk
+                    self.context.set_input_shape(self.input_name, chunk.shape)
+                    cuda.memcpy_htod_async(self.d_input, self.h_input[:n], self.stream)
+                    self.context.execute_async_v3(self.stream.handle)
+                    cuda.memcpy_dtoh_async(self.h_output[:n], self.d_output, self.stream)
+                    self.stream.synchronize()
+                    outputs.append(self.h_output[:n].copy())
+            finally:
+                self._cuda_ctx.pop()
+        
+        return np.concatenate(outputs, axis=0)
+
+
+def build_tensorrt_engine(keras_model):
+    """
+    Convert the Keras model to ONNX and build an FP16 TensorRT engine
+    
+    The serialized engine is cached at ENGINE_PATH and reused until the
+    Keras model file changes.
+    
+    Returns:
+        Serialized engine bytes
+    """
+    if os.path.exists(ENGINE_PATH) and os.path.getmtime(ENGINE_PATH) >= os.path.getmtime(MODEL_PATH):
+        logger.info(f"Loading cached TensorRT engine from {ENGINE_PATH}")
+        with open(ENGINE_PATH, 'rb') as f:
+            return f.read()
+    
+    import tf2onnx
+    
+    logger.info(f"Exporting model to ONNX ({ONNX_PATH})...")
+    input_signature = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(keras_model, input_signature=input_signature,
+                               opset=15, output_path=ONNX_PATH)
+    
+    logger.info("Building TensorRT FP16 engine (this may take a few minutes)...")
+    trt_logger = trt.Logger(trt.Logger.WARNING)
+    builder = trt.Builder(trt_logger)
+    network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+    parser = trt.OnnxParser(network, trt_logger)
+    
+    with open(ONNX_PATH, 'rb') as f:
+        if not parser.parse(f.read()):
+            errors = [str(parser.get_error(i)) for i in range(parser.num_errors)]
+            raise RuntimeError(f"ONNX parsing failed: {'; '.join(errors)}")
+    
+    config = builder.create_builder_config()
+    config.set_flag(trt.BuilderFlag.FP16)
+    config.set_memory_pool_limit(trt.MemoryPoolType.WORKSPACE, 1 << 30)  # 1GB
+    
+    profile = builder.create_optimization_profile()
+    profile.set_shape(network.get_input(0).name,
+                      (1, IMG_SIZE, IMG_SIZE, 3),
+                      (1, IMG_SIZE, IMG_SIZE, 3),
+                      (MAX_BATCH_SIZE, IMG_SIZE, IMG_SIZE, 3))
+    config.add_optimization_profile(profile)
+    
+    serialized_engine = builder.build_serialized_network(network, config)
+    if serialized_engine is None:
+        raise RuntimeError("TensorRT engine build failed")
+    
+    engine_bytes = bytes(serialized_engine)
+    with open(ENGINE_PATH, 'wb') as f:
+        f.write(engine_bytes)
+    logger.info(f"✓ TensorRT engine saved to {ENGINE_PATH}")
+    
+    return engine_bytes
+
+
+class TFLiteModel:
+    """
+    Runs an INT8 TFLite model behind a Keras-like predict() method
+    
+    Expects raw uint8 pixels (0-255); they are requantized only if the
+    model's input scale differs from 1/255.
+    """
+
+    def __init__(self, model_path, keras_model):
+        self.keras_model = keras_model
+        self._lock = threading.Lock()
+        interpreter_class = TFLiteInterpreter or tf.lite.Interpreter
+        self.interpreter = interpreter_class(model_path=model_path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        
+        scale, zero_point = self.input_details['quantization']
+        self._input_scale = scale
+        self._input_zero_point = zero_point
+        self._requantize = not (np.isclose(scale, 1 / 255.0) and zero_point == 0)
+        self._batch_size = 1
+
+    def count_params(self):
+        return self.keras_model.count_params()
+
+    def predict(self, x, verbose=0):
+        """Run inference on a (N, IMG_SIZE, IMG_SIZE, 3) uint8 batch"""
+        if self._requantize:
+            x = np.round(x.astype(np.float32) / 255.0 / self._input_scale + self._input_zero_point)
+            x = np.clip(x, 0, 255)
+        x = np.ascontiguousarray(x, dtype=np.uint8)
+        
+        with self._lock:
+            if len(x) != self._batch_size:
+                self.interpreter.resize_tensor_input(self.input_details['index'], x.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(x)
+            
+            self.interpreter.set_tensor(self.input_details['index'], x)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self.output_details['index'])
+        
+        if np.issubdtype(output.dtype, np.integer):
+            scale, zero_point = self.output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        
+        return output
+
+
+def build_tflite_model(keras_model):
+    """
+    Convert the Keras model to a fully INT8-quantized TFLite model
+    
+    Images in CALIBRATION_DIR serve as the representative dataset. The
+    result is cached at TFLITE_PATH until the Keras model file changes.
+    
+    Returns:
+        Path to the TFLite model
+    """
+    if os.path.exists(TFLITE_PATH) and os.path.getmtime(TFLITE_PATH) >= os.path.getmtime(MODEL_PATH):
+        logger.info(f"Using cached INT8 TFLite model {TFLITE_PATH}")
+        return TFLITE_PATH
+    
+    if not os.path.isdir(CALIBRATION_DIR):
+        raise RuntimeError(f"Calibration directory {CALIBRATION_DIR!r} not found (set CALIBRATION_DIR)")
+    
+    calibration_files = [os.path.join(CALIBRATION_DIR, f) for f in sorted(os.listdir(CALIBRATION_DIR))
+                         if allowed_file(f)]
+    if not calibration_files:
+        raise RuntimeError(f"No calibration images found in {CALIBRATION_DIR!r} (set CALIBRATION_DIR)")
+    
+    def representative_dataset():
+        for path in calibration_files:
+            with Image.open(path) as image:
+                yield [preprocess_image(image, out=np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))]
+    
+    logger.info(f"Quantizing model to INT8 with {len(calibration_files)} calibration images...")
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    tflite_model = converter.convert()
+    
+    with open(TFLITE_PATH, 'wb') as f:
+        f.write(tflite_model)
+    logger.info(f"✓ INT8 TFLite model saved to {TFLITE_PATH}")
+    
+    return TFLITE_PATH
+
+
+def load_keras_model():
+    """Load the Keras model with multiple fallback strategies"""
     try:
         # Strategy 1: Try loading with compile=False
         logger.info(f"Attempting to load model from {MODEL_PATH}...")
@@ -57,55 +380,471 @@ def load_model_safe():
                 return model
         except Exception as e2:
             logger.error(f"Model loading failed: {e2}")
-            logger.info("API will work in DEMO MODE without predictions")
             return None
 
-model = load_model_safe()
+
+class XLAModel:
+    """
+    Runs the Keras forward pass as an XLA-compiled tf.function
+    
+    Inputs are copied into a persistent (MAX_BATCH_SIZE, ...) device
+    variable instead of allocating a new input tensor per call. The model
+    reads the first N rows, where N is the batch size rounded up to the next
+    power of two. This way XLA compiles a handful of fixed-shape programs
+    instead of one per batch size, and the extra rows are ignored. The
+    batch-1 program is compiled eagerly at startup.
+    """
+
+    def __init__(self, inference_model, keras_model, input_dtype=np.float32):
+        self.keras_model = keras_model
+        self.input_dtype = input_dtype
+        self._lock = threading.Lock()
+        self._input = tf.Variable(
+            tf.zeros((MAX_BATCH_SIZE, IMG_SIZE, IMG_SIZE, 3), dtype=tf.as_dtype(input_dtype)),
+            trainable=False
+        )
+        
+        # batch_size is a Python int, so each bucket gets its own static-shape trace
+        @tf.function(jit_compile=True)
+        def infer_slice(batch_size):
+            return inference_model(self._input[:batch_size], training=False)
+        
+        self._infer_slice = infer_slice
+        self.predict(np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=input_dtype))
+
+    def count_params(self):
+        return self.keras_model.count_params()
+
+    def predict(self, x, verbose=0):
+        """Run inference on a (N, IMG_SIZE, IMG_SIZE, 3) batch"""
+        outputs = []
+        with self._lock:
+            for start in range(0, len(x), MAX_BATCH_SIZE):
+                chunk = x[start:start + MAX_BATCH_SIZE]
+                n = len(chunk)
+                self._input[:n].assign(tf.convert_to_tensor(chunk, dtype=self.input_dtype))
+                bucket = 1 << (n - 1).bit_length()
+                outputs.append(self._infer_slice(bucket).numpy()[:n])
+        
+        return np.concatenate(outputs, axis=0)
+
+
+def convert_to_mixed_precision(keras_model):
+    """
+    Clone the model with every layer running under the mixed_float16 policy
+    
+    The output layer is kept in float32 so the sigmoid is computed at full
+    precision. Weights are copied from the original model.
+    """
+    output_layer = keras_model.layers[-1]
+    
+    def clone_layer(layer):
+        if isinstance(layer, tf.keras.Model):
+            return tf.keras.models.clone_model(layer, clone_function=clone_layer)
+        config = layer.get_config()
+        if not isinstance(layer, tf.keras.layers.InputLayer):
+            config['dtype'] = 'float32' if layer is output_layer else 'mixed_float16'
+        return layer.__class__.from_config(config)
+    
+    mixed_model = tf.keras.models.clone_model(keras_model, clone_function=clone_layer)
+    mixed_model.set_weights(keras_model.get_weights())
+    return mixed_model
+
+
+def select_inference_backend(keras_model):
+    """Wrap the Keras model in the fastest available inference backend"""
+    global INPUT_DTYPE
+    
+    if INFERENCE_BACKEND == 'tflite':
+        try:
+            tflite_model = TFLiteModel(build_tflite_model(keras_model), keras_model)
+            INPUT_DTYPE = np.uint8
+            logger.info("✓ Using TFLite INT8 inference backend")
+            return tflite_model
+        except Exception as e:
+            # Explicitly requested, so make the fallback loud
+            logger.error(f"INFERENCE_BACKEND=tflite was requested but the INT8 model could not be "
+                         f"built or loaded; serving with the Keras model instead: {e}")
+    
+    if INFERENCE_BACKEND in ('auto', 'tensorrt'):
+        if trt is None or cuda is None or cuda.Device.count() == 0:
+            if INFERENCE_BACKEND == 'tensorrt':
+                logger.warning("TensorRT requested but not available, falling back to Keras")
+        else:
+            try:
+                trt_model = TensorRTModel(build_tensorrt_engine(keras_model), keras_model)
+                logger.info("✓ Using TensorRT FP16 inference backend")
+                return trt_model
+            except Exception as e:
+                logger.warning(f"TensorRT setup failed, falling back to Keras: {e}")
+    
+    inference_model = keras_model
+    
+    if MIXED_PRECISION and tf.config.list_physical_devices('GPU'):
+        try:
+            inference_model = convert_to_mixed_precision(keras_model)
+            INPUT_DTYPE = np.float16
+            logger.info("✓ Using Keras mixed_float16 inference backend")
+        except Exception as e:
+            logger.warning(f"Mixed precision conversion failed, using float32: {e}")
+    
+    if XLA_COMPILE:
+        try:
+            xla_model = XLAModel(inference_model, keras_model, INPUT_DTYPE)
+            logger.info("✓ Compiled Keras forward pass with XLA")
+            return xla_model
+        except Exception as e:
+            logger.warning(f"XLA compilation failed, using plain Keras: {e}")
+    
+    return inference_model
+
+
+# Inter-request batching: handlers enqueue preprocessed images and a single
+# background thread runs them through the model in one call per batch
+BatchItem = namedtuple('BatchItem', ['images', 'future'])
+BATCH_QUEUE = queue.Queue()
+
+
+def _drain_batch_queue():
+    """Block for one item, then gather more until the batch is full or MAX_BATCH_WAIT expires"""
+    items = [BATCH_QUEUE.get()]
+    batch_size = len(items[0].images)
+    deadline = time.monotonic() + MAX_BATCH_WAIT
+    
+    while batch_size < MAX_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            item = BATCH_QUEUE.get(timeout=remaining)
+        except queue.Empty:
+            break
+        items.append(item)
+        batch_size += len(item.images)
+    
+    return items
+
+
+def _run_model(inference_model, batch):
+    """
+    Run one forward pass and return an (N, 1) numpy array
+    
+    Plain Keras models are called directly; predict() adds data-adapter,
+    callback and distribution setup on every call, which dominates at
+    small batch sizes. The wrapper backends expose their own predict().
+    """
+    if isinstance(inference_model, tf.keras.Model):
+        return inference_model(batch, training=False).numpy()
+    return inference_model.predict(batch, verbose=0)
+
+
+def _batch_worker(inference_model):
+    """Run queued images through the model and fan results back to their futures"""
+    while True:
+        items = _drain_batch_queue()
+        try:
+            batch = np.concatenate([item.images for item in items], axis=0)
+            predictions = _run_model(inference_model, batch)[:, 0]
+        except Exception as e:
+            logger.error(f"Batched inference failed: {e}")
+            for item in items:
+                item.future.set_exception(e)
+            continue
+        
+        offset = 0
+        for item in items:
+            count = len(item.images)
+            item.future.set_result(predictions[offset:offset + count])
+            offset += count
+
+
+def submit_inference(images):
+    """
+    Queue preprocessed images for batched inference
+    
+    Args:
+        images: Numpy array of shape (N, IMG_SIZE, IMG_SIZE, 3)
+        
+    Returns:
+        Future resolving to an array of N pneumonia probabilities
+    """
+    future = Future()
+    BATCH_QUEUE.put(BatchItem(images, future))
+    return future
+
+
+def load_model_safe():
+    """Safely load model, select an inference backend and start the batcher"""
+    keras_model = load_keras_model()
+    if keras_model is None:
+        logger.info("API will work in DEMO MODE without predictions")
+        return None
+    
+    inference_model = select_inference_backend(keras_model)
+    _warm_up_normalize_kernel()
+    threading.Thread(target=_batch_worker, args=(inference_model,),
+                     name='pneumonet-batcher', daemon=True).start()
+    
+    return inference_model
+
+
+_ALLOWED_SUFFIXES = tuple('.' + ext for ext in ALLOWED_EXTENSIONS)
 
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+
+_timestamp_cache = (float('-inf'), '')
+
+
+def current_timestamp():
+    """ISO timestamp for responses, reformatted at most every TIMESTAMP_RESOLUTION seconds"""
+    global _timestamp_cache
+    now = time.monotonic()
+    cached_at, timestamp = _timestamp_cache
+    if now - cached_at >= TIMESTAMP_RESOLUTION:
+        timestamp = datetime.now().isoformat()
+        _timestamp_cache = (now, timestamp)
+    return timestamp
+
+
+def sniff_image_format(image_data):
+    """Identify a supported image format from its magic bytes, or None if unsupported"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if image_data.startswith(signature):
+            return image_format
+    return None
+
+
+def _read_upload(file):
+    """Read an uploaded file, validating its content rather than its filename"""
+    image_data = file.read()
+    if sniff_image_format(image_data) is None:
+        raise ValueError('Invalid file type')
+    return image_data
+
+
+class _StreamReader:
+    """
+    File-like view of the request body for ijson
+    
+    ijson probes its input with read(0), which Werkzeug's LimitedStream (used
+    by the development server and test client) treats as a client disconnect.
+    """
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def read(self, size=-1):
+        if size == 0:
+            return b''
+        return self._stream.read(size)
+
+
+_scratch = threading.local()
+
+
+def _get_scratch_buffer():
+    """Return this thread's reusable (1, IMG_SIZE, IMG_SIZE, 3) input buffer"""
+    buffer = getattr(_scratch, 'buffer', None)
+    if buffer is None or buffer.dtype != INPUT_DTYPE:
+        buffer = _scratch.buffer = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype=INPUT_DTYPE)
+    return buffer
+
+
+def _resize_pixels(pixels):
+    """
+    Resize a decoded uint8 array to the model input size with OpenCV
+    
+    INTER_AREA antialiases when shrinking (closest to PIL's filters used in
+    training); INTER_LINEAR is used for the rare upscale.
+    """
+    height, width = pixels.shape[:2]
+    shrinking = height > IMG_SIZE or width > IMG_SIZE
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    return cv2.resize(pixels, (IMG_SIZE, IMG_SIZE), interpolation=interpolation)
 
 
-def preprocess_image(image_data):
+def _decode_jpeg_fast(image_data):
+    """Decode a JPEG with libjpeg-turbo and resize it with OpenCV to an RGB uint8 array"""
+    pixels = simplejpeg.decode_jpeg(image_data, colorspace='RGB')
+    return _resize_pixels(pixels)
+
+
+def _decode_opencv(image_data):
+    """
+    Decode and resize an image with OpenCV to an RGB uint8 array
+    
+    EXIF orientation is ignored to match the PIL path. Returns None for
+    formats OpenCV cannot decode (e.g. GIF).
+    """
+    pixels = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8),
+                          cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if pixels is None:
+        return None
+    # Swap channels after resizing so the conversion runs on 224x224 pixels
+    return cv2.cvtColor(_resize_pixels(pixels), cv2.COLOR_BGR2RGB)
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _normalize_pixels(src, dst):
+        """Scale an (H, W, 3) uint8 image into an (H, W, 3) float32 buffer in [0, 1]"""
+        scale = np.float32(1.0 / 255.0)
+        for i in range(src.shape[0]):
+            for j in range(src.shape[1]):
+                for c in range(src.shape[2]):
+                    dst[i, j, c] = src[i, j, c] * scale
+else:
+    _normalize_pixels = None
+
+
+def _warm_up_normalize_kernel():
+    """Compile the Numba normalization kernel at startup instead of on the first request"""
+    if _normalize_pixels is None or INPUT_DTYPE != np.float32:
+        return
+    
+    dst = np.empty((IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    src = np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    _normalize_pixels(src, dst)  # OpenCV decode path (writable pixels)
+    src.setflags(write=False)
+    _normalize_pixels(src, dst)  # PIL path: np.asarray(image) is read-only
+    logger.info("✓ Normalization kernel compiled")
+
+
+def preprocess_image(image_data, out=None):
     """
     Preprocess image for model prediction
     
     Args:
-        image_data: PIL Image or bytes
+        image_data: PIL Image or raw encoded bytes (bytes use the OpenCV/libjpeg-turbo path)
+        out: Optional (1, IMG_SIZE, IMG_SIZE, 3) INPUT_DTYPE array to write into.
+            Defaults to a per-thread scratch buffer that is overwritten by the
+            next call on the same thread, so callers must not keep a
+            reference to it across requests.
         
     Returns:
         Preprocessed numpy array ready for prediction
     """
     try:
-        # If image_data is bytes, load it
-        if isinstance(image_data, bytes):
-            image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        else:
-            image = image_data.convert('RGB') if image_data.mode != 'RGB' else image_data
+        pixels = None
         
-        # Resize to model input size
-        image = image.resize((IMG_SIZE, IMG_SIZE), Image.Resampling.LANCZOS)
+        # Encoded bytes skip PIL entirely: JPEGs go through libjpeg-turbo when
+        # simplejpeg is available, everything else through cv2.imdecode.
+        # HIGH_QUALITY_RESIZE keeps PIL's LANCZOS, which OpenCV cannot match.
+        if isinstance(image_data, bytes) and cv2 is not None and not HIGH_QUALITY_RESIZE:
+            if image_data[:3] == b'\xff\xd8\xff' and simplejpeg is not None:
+                try:
+                    pixels = _decode_jpeg_fast(image_data)
+                except Exception as e:
+                    logger.debug(f"Fast JPEG decode failed, trying OpenCV: {e}")
+            
+            if pixels is None:
+                pixels = _decode_opencv(image_data)
         
-        # Convert to numpy array and normalize
-        image_array = np.array(image, dtype=np.float32) / 255.0
+        if pixels is None:
+            # If image_data is bytes, load it
+            if isinstance(image_data, bytes):
+                image = Image.open(io.BytesIO(image_data))
+            else:
+                image = image_data
+            
+            # Resize to model input size. Grayscale/RGB images are resized first so
+            # the color conversion runs on the small 224x224 image; other modes
+            # (palette, 1-bit, CMYK...) must be converted before resampling.
+            if image.mode in ('L', 'RGB'):
+                image = image.resize((IMG_SIZE, IMG_SIZE), RESAMPLE_FILTER)
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+            else:
+                image = image.convert('RGB').resize((IMG_SIZE, IMG_SIZE), RESAMPLE_FILTER)
+            
+            pixels = np.asarray(image, dtype=np.uint8)
         
-        # Add batch dimension
-        image_array = np.expand_dims(image_array, axis=0)
+        # Normalize to 0-1 in a single pass straight into the batched output buffer
+        # (quantized backends take the raw uint8 pixels as-is)
+        if out is None:
+            out = _get_scratch_buffer()
+        if out.dtype == np.uint8:
+            out[0] = pixels
+        elif out.dtype == np.float32 and _normalize_pixels is not None:
+            _normalize_pixels(pixels, out[0])
+        else:
+            np.multiply(pixels, np.float32(1 / 255.0), out=out[0])
         
-        return image_array
+        return out
     except Exception as e:
         logger.error(f"Error preprocessing image: {e}")
         raise
 
 
+class PredictionCache:
+    """
+    Thread-safe LRU cache of pneumonia probabilities keyed by image content
+    
+    Only the raw probability is stored, so threshold changes still apply to
+    cached results.
+    """
+
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(image_data):
+        """Hash raw image bytes into a cache key"""
+        if xxhash is not None:
+            return xxhash.xxh3_64_hexdigest(image_data)
+        return hashlib.blake2b(image_data, digest_size=16).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            confidence = self._data.get(key)
+            if confidence is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return confidence
+
+    def put(self, key, confidence):
+        with self._lock:
+            self._data[key] = confidence
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+prediction_cache = PredictionCache()
+
+# PIL and NumPy release the GIL, so batch uploads are decoded in parallel
+PREPROCESS_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix='pneumonet-preprocess')
+
+model = load_model_safe()
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         'status': 'healthy',
-        'timestamp': datetime.now().isoformat(),
+        'timestamp': current_timestamp(),
         'model_loaded': model is not None
     }), 200
 
@@ -117,6 +856,7 @@ def predict():
     
     Accepts either:
     - Multipart form data with 'image' file
+    - Raw image bytes with Content-Type: application/octet-stream
     - JSON with base64 encoded image
     
     Returns:
@@ -132,7 +872,7 @@ def predict():
         }), 503  # Service Unavailable status code
     
     try:
-        image = None
+        image_data = None
         filename = 'unknown'
         
         # Check if file is in request
@@ -142,41 +882,62 @@ def predict():
             if file.filename == '':
                 return jsonify({'error': 'No file selected'}), 400
             
-            if not allowed_file(file.filename):
+            # Validate the content itself rather than the client-supplied extension
+            try:
+                image_data = _read_upload(file)
+            except ValueError:
                 return jsonify({'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
             
             filename = secure_filename(file.filename)
-            image = Image.open(file.stream)
+            
+        elif request.mimetype == 'application/octet-stream':
+            # Raw image bytes as the request body: no multipart or base64 overhead
+            image_data = request.get_data(cache=False)
+            if sniff_image_format(image_data) is None:
+                return jsonify({'error': f'Invalid file type. Allowed: {", ".join(ALLOWED_EXTENSIONS)}'}), 400
             
         elif request.is_json:
-            # Handle base64 encoded image
-            data = request.get_json()
-            if 'image' not in data:
+            # Handle base64 encoded image, streaming out only the 'image' field
+            # so a multi-MB payload is not materialized as a Python dict
+            try:
+                if ijson is not None:
+                    image_base64 = next(ijson.items(_StreamReader(request.stream), 'image'), None)
+                else:
+                    image_base64 = request.get_json().get('image')
+            except Exception as e:
+                return jsonify({'error': f'Invalid JSON body: {str(e)}'}), 400
+            
+            if image_base64 is None:
                 return jsonify({'error': 'No image provided in JSON'}), 400
             
-            import base64
             try:
-                image_base64 = data['image']
-                image_data = base64.b64decode(image_base64)
-                image = Image.open(io.BytesIO(image_data))
+                image_data = base64.b64decode(image_base64, validate=False)
+                if sniff_image_format(image_data) is None:
+                    raise ValueError('unsupported image format')
             except Exception as e:
                 return jsonify({'error': f'Invalid base64 image: {str(e)}'}), 400
         else:
-            return jsonify({'error': 'No image file or JSON data provided'}), 400
+            return jsonify({'error': 'No image file, raw image or JSON data provided'}), 400
         
-        # Preprocess the image
-        processed_image = preprocess_image(image)
+        # Identical images are answered from the cache
+        cache_key = prediction_cache.key(image_data)
+        confidence = prediction_cache.get(cache_key)
         
-        # Make prediction
-        prediction = model.predict(processed_image, verbose=0)
-        confidence = float(prediction[0][0])
+        if confidence is None:
+            # Preprocess the image
+            processed_image = preprocess_image(image_data)
+            
+            # Make prediction (batched with concurrent requests)
+            prediction = submit_inference(processed_image).result(timeout=PREDICTION_TIMEOUT)
+            confidence = float(prediction[0])
+            prediction_cache.put(cache_key, confidence)
         
         # Determine class based on threshold
         is_pneumonia = confidence > THRESHOLD
         
         # Prepare response
         response = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': current_timestamp(),
             'filename': filename,
             'prediction': {
                 'pneumonia_probability': round(confidence, 4),
@@ -227,42 +988,71 @@ def predict_batch():
         if len(files) == 0:
             return jsonify({'error': 'No images selected'}), 400
         
-        predictions_list = []
         errors = []
+        valid_files = []
+        confidences = {}
+        uncached = []
         
+        # Single pass over the uploads: read, check magic bytes and answer
+        # repeated images from the cache; only the rest are decoded
         for idx, file in enumerate(files):
+            if file.filename == '':
+                errors.append({'index': idx, 'error': 'No filename'})
+                continue
+            
             try:
-                if file.filename == '':
-                    errors.append({'index': idx, 'error': 'No filename'})
-                    continue
-                
-                if not allowed_file(file.filename):
-                    errors.append({'index': idx, 'filename': file.filename, 
-                                 'error': f'Invalid file type'})
-                    continue
-                
-                # Process image
-                image = Image.open(file.stream)
-                processed_image = preprocess_image(image)
-                
-                # Predict
-                prediction = model.predict(processed_image, verbose=0)
-                confidence = float(prediction[0][0])
-                is_pneumonia = confidence > THRESHOLD
-                
-                predictions_list.append({
-                    'filename': secure_filename(file.filename),
-                    'pneumonia_probability': round(confidence, 4),
-                    'normal_probability': round(1 - confidence, 4),
-                    'predicted_class': 'PNEUMONIA' if is_pneumonia else 'NORMAL',
-                    'confidence': round(max(confidence, 1 - confidence) * 100, 2)
-                })
-                
+                image_data = _read_upload(file)
             except Exception as e:
                 errors.append({'index': idx, 'filename': file.filename, 'error': str(e)})
+                continue
+            
+            valid_files.append((idx, file))
+            cache_key = prediction_cache.key(image_data)
+            confidence = prediction_cache.get(cache_key)
+            if confidence is None:
+                uncached.append((idx, file, image_data, cache_key))
+            else:
+                confidences[idx] = confidence
+        
+        # Decode and preprocess in parallel, each worker writing its own row
+        batch_buffer = np.empty((len(uncached), IMG_SIZE, IMG_SIZE, 3), dtype=INPUT_DTYPE)
+        preprocess_futures = [
+            PREPROCESS_POOL.submit(preprocess_image, image_data, out=batch_buffer[row:row + 1])
+            for row, (idx, file, image_data, cache_key) in enumerate(uncached)
+        ]
+        
+        processed = []
+        for row, ((idx, file, _, cache_key), future) in enumerate(zip(uncached, preprocess_futures)):
+            try:
+                future.result()
+                processed.append((row, idx, file, cache_key))
+            except Exception as e:
+                errors.append({'index': idx, 'filename': file.filename, 'error': str(e)})
+        
+        # One batched inference call for every successfully decoded image
+        if processed:
+            rows = [row for row, _, _, _ in processed]
+            images = batch_buffer if len(rows) == len(uncached) else batch_buffer[rows]
+            
+            try:
+                results = submit_inference(images).result(timeout=PREDICTION_TIMEOUT)
+                for (_, idx, _, cache_key), confidence in zip(processed, results):
+                    confidences[idx] = float(confidence)
+                    prediction_cache.put(cache_key, confidences[idx])
+            except Exception as e:
+                for _, idx, file, _ in processed:
+                    errors.append({'index': idx, 'filename': file.filename, 'error': str(e)})
+        
+        # Format every prediction in one vectorized pass, in upload order
+        predicted = [(idx, file) for idx, file in valid_files if idx in confidences]
+        predictions_list = format_prediction_responses(
+            np.array([confidences[idx] for idx, _ in predicted]),
+            threshold=THRESHOLD,
+            filenames=[secure_filename(file.filename) for _, file in predicted]
+        )
         
         response = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': current_timestamp(),
             'total_images': len(files),
             'successful_predictions': len(predictions_list),
             'failed_predictions': len(errors),
@@ -293,6 +1083,7 @@ def model_info():
         'output_classes': ['NORMAL', 'PNEUMONIA'],
         'classification_threshold': THRESHOLD,
         'supported_formats': list(ALLOWED_EXTENSIONS),
+        'prediction_cache': prediction_cache.stats(),
         'status': 'ready'
     }), 200
 
@@ -343,7 +1134,7 @@ def index():
             'GET /': 'This help message',
             'GET /health': 'Health check',
             'GET /info': 'Model information',
-            'POST /predict': 'Single image prediction (multipart form or base64 JSON)',
+            'POST /predict': 'Single image prediction (multipart form, raw octet-stream or base64 JSON)',
             'POST /predict-batch': 'Batch image prediction',
             'GET /threshold': 'Get current classification threshold',
             'POST /threshold': 'Update classification threshold'
@@ -351,6 +1142,7 @@ def index():
         'usage': {
             'single_prediction_curl': 'curl -X POST -F "image=@image.jpg" http://localhost:5000/predict',
             'batch_prediction_curl': 'curl -X POST -F "images=@image1.jpg" -F "images=@image2.jpg" http://localhost:5000/predict-batch',
+            'raw_prediction_curl': 'curl -X POST -H "Content-Type: application/octet-stream" --data-binary @image.jpg http://localhost:5000/predict',
             'base64_prediction': 'POST /predict with JSON body: {"image": "base64_encoded_image_string"}'
         },
         'response_format': {
@@ -370,8 +1162,7 @@ def get_test_images():
         if not os.path.exists(test_images_dir):
             return jsonify({'images': []}), 200
         
-        images = [f for f in os.listdir(test_images_dir) 
-                 if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+        images = [f for f in os.listdir(test_images_dir) if allowed_file(f)]
         images.sort()
         
         return jsonify({'images': images}), 200
@@ -397,6 +1188,6 @@ if __name__ == '__main__':
     if model is None:
         logger.warning("Model not loaded. Check if pneumonia_model.keras exists.")
     
-    # Run Flask app
-    # For production, use gunicorn: gunicorn -w 4 -b 0.0.0.0:5000 app:app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Run Flask app (the reloader is disabled so the model is only loaded once)
+    # For production, use gunicorn: gunicorn -c gunicorn.conf.py app:app
+    app.run(debug=True, use_reloader=False, host='0.0.0.0', port=5000, threaded=True)
@@ -3,12 +3,20 @@ PneumoNet AI Client Library
 Simple Python client for interacting with the PneumoNet AI Flask API
 """
 
-import requests
-import base64
+import httpx
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Tuple
 import json
 
+# SIMD-accelerated base64 (drop-in replacement for the stdlib module)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
 
 class PneumoNetClient:
     """
@@ -30,11 +38,17 @@ class PneumoNetClient:
         """
         self.api_url = api_url.rstrip('/')
         self.timeout = timeout
-        self.session = requests.Session()
+        # Keep-alive connection pool; HTTP/2 is negotiated on https:// URLs
+        self.limits = httpx.Limits(max_keepalive_connections=20)
+        self.session = httpx.Client(http2=True, timeout=timeout, limits=self.limits)
     
     def __repr__(self) -> str:
         return f"PneumoNetClient(url='{self.api_url}')"
     
+    def close(self) -> None:
+        """Close pooled connections"""
+        self.session.close()
+    
     def health_check(self) -> bool:
         """
         Check if API is healthy and responsive
@@ -69,13 +83,16 @@ class PneumoNetClient:
         except Exception as e:
             raise Exception(f"Failed to get model info: {e}")
     
-    def predict_image(self, image_path: str, use_base64: bool = False) -> Dict:
+    def predict_image(self, image_path: str, use_base64: bool = False,
+                      use_raw: bool = False) -> Dict:
         """
         Predict pneumonia for a single image
         
         Args:
             image_path: Path to image file
             use_base64: If True, send image as base64. If False, use file upload.
+            use_raw: If True, send the raw image bytes as an application/octet-stream
+                body (smallest payload, no base64 or multipart encoding)
             
         Returns:
             Prediction results with confidence scores
@@ -90,7 +107,9 @@ class PneumoNetClient:
             if not image_path.exists():
                 raise FileNotFoundError(f"Image file not found: {image_path}")
             
-            if use_base64:
+            if use_raw:
+                return self._predict_raw(image_path)
+            elif use_base64:
                 return self._predict_base64(image_path)
             else:
                 return self._predict_file_upload(image_path)
@@ -110,30 +129,53 @@ class PneumoNetClient:
         response.raise_for_status()
         return response.json()
     
+    def _predict_raw(self, image_path: Path) -> Dict:
+        """Predict by sending the raw image bytes as the request body"""
+        with open(image_path, 'rb') as f:
+            image_bytes = f.read()
+        
+        response = self.session.post(
+            f"{self.api_url}/predict",
+            content=image_bytes,
+            headers={'Content-Type': 'application/octet-stream'},
+            timeout=self.timeout
+        )
+        
+        response.raise_for_status()
+        return response.json()
+    
     def _predict_base64(self, image_path: Path) -> Dict:
         """Predict using base64 encoded image"""
+        # The base64 alphabet needs no JSON escaping, so skip decode + json.dumps
         with open(image_path, 'rb') as f:
-            image_base64 = base64.b64encode(f.read()).decode('utf-8')
+            body = b'{"image":"' + base64.b64encode(f.read()) + b'"}'
         
-        payload = {'image': image_base64}
         response = self.session.post(
             f"{self.api_url}/predict",
-            json=payload,
+            content=body,
+            headers={'Content-Type': 'application/json'},
             timeout=self.timeout
         )
         
         response.raise_for_status()
         return response.json()
     
-    def predict_batch(self, image_paths: List[str]) -> Dict:
+    def predict_batch(self, image_paths: List[str], max_workers: int = 8) -> Dict:
         """
-        Predict for multiple images in one request
+        Predict for multiple images concurrently
+        
+        Each image is posted to /predict from a small thread pool sharing the
+        client's pooled connections (multiplexed on a single connection with
+        HTTP/2), letting the server batch them together with other in-flight
+        requests. Safe to call from Jupyter, where an event loop is already running.
         
         Args:
             image_paths: List of paths to image files
+            max_workers: Maximum number of uploads in flight (kept below the
+                connection pool size so large batches never wait on the pool)
             
         Returns:
-            Batch prediction results
+            Batch prediction results in the same format as /predict-batch
             
         Example:
             results = client.predict_batch(['image1.jpg', 'image2.jpg', 'image3.jpg'])
@@ -141,27 +183,60 @@ class PneumoNetClient:
                 print(f"{pred['filename']}: {pred['predicted_class']}")
         """
         try:
-            files = []
-            for image_path in image_paths:
-                path = Path(image_path)
+            paths = [Path(image_path) for image_path in image_paths]
+            for path in paths:
                 if not path.exists():
                     raise FileNotFoundError(f"Image file not found: {path}")
-                files.append(('images', open(path, 'rb')))
-            
-            response = self.session.post(
-                f"{self.api_url}/predict-batch",
-                files=files,
-                timeout=self.timeout
-            )
-            
-            # Close files
-            for _, file_obj in files:
-                file_obj.close()
-            
-            response.raise_for_status()
-            return response.json()
         except Exception as e:
             raise Exception(f"Batch prediction failed: {e}")
+        
+        results = []
+        if paths:
+            workers = min(max_workers, self.limits.max_keepalive_connections, len(paths))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._predict_mmap_upload, path) for path in paths]
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        results.append(e)
+        
+        predictions = []
+        errors = []
+        for idx, (path, result) in enumerate(zip(paths, results)):
+            if isinstance(result, Exception):
+                errors.append({'index': idx, 'filename': path.name, 'error': str(result)})
+                continue
+            
+            pred = result['prediction']
+            predictions.append({
+                'filename': result['filename'],
+                'pneumonia_probability': pred['pneumonia_probability'],
+                'normal_probability': pred['normal_probability'],
+                'predicted_class': pred['predicted_class'],
+                'confidence': pred['confidence']
+            })
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'total_images': len(paths),
+            'successful_predictions': len(predictions),
+            'failed_predictions': len(errors),
+            'predictions': predictions,
+            'errors': errors if errors else None,
+            'status': 'success' if len(errors) == 0 else 'partial_success'
+        }
+    
+    def _predict_mmap_upload(self, image_path: Path) -> Dict:
+        """Predict using a memory-mapped file upload on the pooled client"""
+        # The upload is streamed from the page cache in chunks instead of
+        # first copying the whole file into a bytes object
+        with open(image_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            files = {'image': (image_path.name, mm)}
+            response = self.session.post(f"{self.api_url}/predict", files=files, timeout=self.timeout)
+        
+        response.raise_for_status()
+        return response.json()
     
     def get_threshold(self) -> float:
         """
@@ -0,0 +1,74 @@
+"""
+Gunicorn configuration for PneumoNet AI
+
+A single worker process owns the model (one copy in GPU/CPU memory) and
+serves many concurrent connections with threads. Every request thread feeds
+the shared inference batcher in app.py, so concurrent requests are combined
+into one model call instead of competing for the GPU from separate
+processes. CPU-heavy preprocessing runs on app.PREPROCESS_POOL; add threads
+here rather than model-holding workers to scale.
+
+Accelerated inference artifacts (TensorRT engine, INT8 TFLite model) are
+built before the worker starts, see on_starting below, so a first boot is not
+killed by the worker timeout.
+
+Usage:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# One process holding the model; do not raise this to scale throughput
+workers = 1
+
+# Real OS threads (not gevent greenlets): the batcher and preprocessing pool
+# rely on PIL/NumPy/TensorFlow releasing the GIL to run in parallel
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '64'))
+
+# The worker must load the model (and any cached engine) and finish the XLA
+# warm-up compile within this many seconds before it first heartbeats
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Load the app inside the worker so the batcher thread is started there
+# (threads do not survive a fork from a preloaded master)
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def on_starting(server):
+    """
+    Build the TensorRT engine / INT8 TFLite model ahead of the worker
+    
+    Building can take minutes, longer than the worker timeout, and the engine
+    is only written once the build succeeds, so a build inside the worker
+    would be killed and restarted forever. Importing app in a child process
+    runs the same build (cached next to the model) without a timeout and
+    without initializing CUDA in the master, which the forked worker could
+    not use. Set PREBUILD_ARTIFACTS=0 to skip.
+    """
+    if os.environ.get('PREBUILD_ARTIFACTS', '1') != '1':
+        return
+    
+    backend = os.environ.get('INFERENCE_BACKEND', 'auto').lower()
+    needs_build = backend == 'tflite' or (
+        backend in ('auto', 'tensorrt') and importlib.util.find_spec('tensorrt') is not None
+    )
+    if not needs_build:
+        return
+    
+    server.log.info(f"Building {backend} inference artifacts before starting the worker...")
+    result = subprocess.run([sys.executable, '-c', 'import app'], check=False)
+    if result.returncode != 0:
+        server.log.warning(f"Artifact prebuild exited with code {result.returncode}; "
+                           "the worker will retry the build on startup")
@@ -4,49 +4,177 @@ Provides functions to test the API endpoints with sample images
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import contextlib
+import functools
+import hashlib
 import json
+import mimetypes
+import mmap
+import os
 import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-import base64
 from PIL import Image
 import io
 
+# SIMD-accelerated base64 (drop-in replacement for the stdlib module)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# Fast C-accelerated JSON serialization for printing results
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from requests_toolbelt import MultipartEncoder
+except ImportError:
+    MultipartEncoder = None
+
+
+def _hash_file(file_obj) -> str:
+    """SHA-256 of an open file via a read-only memory map (empty files cannot be mapped)"""
+    if os.fstat(file_obj.fileno()).st_size == 0:
+        return hashlib.sha256(b'').hexdigest()
+    with mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return hashlib.sha256(mapped).hexdigest()
+
+
+def cached_by_content(maxsize: int = 128, ttl: float = 60.0):
+    """
+    Cache a tester method's successful results by the SHA-256 of the image file
+    
+    The file is opened once and hashed through a read-only memory map (no
+    bytes copy); the wrapped method receives the open file to upload, which
+    the multipart encoder streams in chunks. Entries live in the instance's
+    OrderedDict-based LRU for ttl seconds.
+    
+    Args:
+        maxsize: Maximum number of cached results
+        ttl: Seconds a cached result stays valid
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, image_path: str) -> dict:
+            cache = self._prediction_cache
+            try:
+                with open(image_path, 'rb') as image_file:
+                    key = _hash_file(image_file)
+                    with self._prediction_cache_lock:
+                        cached = cache.get(key)
+                        if cached is not None and time.monotonic() - cached[0] < ttl:
+                            cache.move_to_end(key)
+                            return cached[1]
+                    
+                    result = func(self, image_path, image_file)
+            except FileNotFoundError:
+                return {'status': 'error', 'message': f'File not found: {image_path}'}
+            except Exception as e:
+                return {'status': 'error', 'message': str(e)}
+            
+            if result.get('status') == 'success':
+                with self._prediction_cache_lock:
+                    cache[key] = (time.monotonic(), result)
+                    cache.move_to_end(key)
+                    if len(cache) > maxsize:
+                        cache.popitem(last=False)
+            return result
+        return wrapper
+    return decorator
+
 
 class PneumoNetAPITester:
     """Test client for PneumoNet AI API"""
     
-    def __init__(self, base_url: str = "http://localhost:5000"):
+    def __init__(self, base_url: str = "http://localhost:5000", cache_ttl: float = 10.0):
         """
         Initialize the API tester
         
         Args:
             base_url: Base URL of the Flask API
+            cache_ttl: Seconds to reuse successful health/info/threshold responses
         """
         self.base_url = base_url
+        self.cache_ttl = cache_ttl
+        self._cache = {}  # path -> (monotonic timestamp, result)
+        self._prediction_cache = OrderedDict()  # file SHA-256 -> (monotonic timestamp, result)
+        self._prediction_cache_lock = threading.Lock()  # predict_parallel shares the cache
         self.session = requests.Session()
+        
+        # Larger keep-alive pool with retries on connection errors
+        adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50, max_retries=3)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
-    def health_check(self) -> dict:
-        """Check if API is healthy"""
+    def _cached_get(self, path: str) -> dict:
+        """GET a near-static endpoint, reusing a successful result for cache_ttl seconds"""
+        cached = self._cache.get(path)
+        if cached is not None and time.monotonic() - cached[0] < self.cache_ttl:
+            return cached[1]
+        
         try:
-            response = self.session.get(f"{self.base_url}/health")
+            response = self.session.get(f"{self.base_url}{path}")
             response.raise_for_status()
-            return {'status': 'success', 'data': response.json()}
+            result = {'status': 'success', 'data': response.json()}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
+        
+        self._cache[path] = (time.monotonic(), result)
+        return result
+    
+    def health_check(self) -> dict:
+        """Check if API is healthy"""
+        return self._cached_get('/health')
     
     def get_model_info(self) -> dict:
         """Get model information"""
-        try:
-            response = self.session.get(f"{self.base_url}/info")
-            response.raise_for_status()
-            return {'status': 'success', 'data': response.json()}
-        except Exception as e:
-            return {'status': 'error', 'message': str(e)}
+        return self._cached_get('/info')
     
-    def predict_image_file(self, image_path: str) -> dict:
+    def _post_multipart(self, endpoint: str, fields: list) -> requests.Response:
+        """
+        POST multipart form fields, streaming file contents instead of buffering them
+        
+        Args:
+            endpoint: API path, e.g. '/predict'
+            fields: List of (field_name, (filename, file_obj, content_type)) tuples
+            
+        Returns:
+            Streamed response (use as a context manager to release the connection)
+        """
+        url = f"{self.base_url}{endpoint}"
+        if MultipartEncoder is None:
+            return self.session.post(url, files=fields, stream=True)
+        
+        encoder = MultipartEncoder(fields=fields)
+        return self.session.post(
+            url,
+            data=encoder,
+            headers={'Content-Type': encoder.content_type},
+            stream=True
+        )
+    
+    @staticmethod
+    def _file_field(name: str, image_path: str, file_obj) -> tuple:
+        """Build a multipart file field for an open image file"""
+        content_type = mimetypes.guess_type(image_path)[0] or 'application/octet-stream'
+        return (name, (Path(image_path).name, file_obj, content_type))
+    
+    @cached_by_content(maxsize=128, ttl=60.0)
+    def predict_image_file(self, image_path: str, image_file) -> dict:
         """
         Predict for a single image file
         
+        Repeated files with identical contents are answered from a local cache.
+        The open file to upload is supplied internally by cached_by_content;
+        callers pass only the path.
+        
         Args:
             image_path: Path to image file
             
@@ -54,15 +182,10 @@ class PneumoNetAPITester:
             Prediction results
         """
         try:
-            if not Path(image_path).exists():
-                return {'status': 'error', 'message': f'File not found: {image_path}'}
-            
-            with open(image_path, 'rb') as f:
-                files = {'image': f}
-                response = self.session.post(f"{self.base_url}/predict", files=files)
-            
-            response.raise_for_status()
-            return {'status': 'success', 'data': response.json()}
+            fields = [self._file_field('image', image_path, image_file)]
+            with self._post_multipart('/predict', fields) as response:
+                response.raise_for_status()
+                return {'status': 'success', 'data': response.json()}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
@@ -77,21 +200,21 @@ class PneumoNetAPITester:
             Prediction results
         """
         try:
-            if not Path(image_path).exists():
-                return {'status': 'error', 'message': f'File not found: {image_path}'}
-            
+            # Encode the on-disk bytes directly; the base64 alphabet needs no
+            # JSON escaping, so the body is assembled without json.dumps
             with open(image_path, 'rb') as f:
-                image_base64 = base64.b64encode(f.read()).decode('utf-8')
+                body = b'{"image":"' + base64.b64encode(f.read()) + b'"}'
             
-            payload = {'image': image_base64}
             response = self.session.post(
                 f"{self.base_url}/predict",
-                json=payload,
+                data=body,
                 headers={'Content-Type': 'application/json'}
             )
             
             response.raise_for_status()
             return {'status': 'success', 'data': response.json()}
+        except FileNotFoundError:
+            return {'status': 'error', 'message': f'File not found: {image_path}'}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
@@ -106,31 +229,50 @@ class PneumoNetAPITester:
             Prediction results for all images
         """
         try:
-            files = []
-            for image_path in image_paths:
-                if not Path(image_path).exists():
-                    return {'status': 'error', 'message': f'File not found: {image_path}'}
-                files.append(('images', open(image_path, 'rb')))
-            
-            response = self.session.post(f"{self.base_url}/predict-batch", files=files)
-            
-            # Close all files
-            for _, file_obj in files:
-                file_obj.close()
-            
-            response.raise_for_status()
-            return {'status': 'success', 'data': response.json()}
+            # Every opened file is closed on exit, including early returns
+            with contextlib.ExitStack() as stack:
+                files = []
+                for image_path in image_paths:
+                    try:
+                        file_obj = stack.enter_context(open(image_path, 'rb'))
+                    except FileNotFoundError:
+                        return {'status': 'error', 'message': f'File not found: {image_path}'}
+                    files.append(self._file_field('images', image_path, file_obj))
+                
+                response = stack.enter_context(self._post_multipart('/predict-batch', files))
+                response.raise_for_status()
+                return {'status': 'success', 'data': response.json()}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
     
+    def predict_parallel(self, image_paths: list, max_workers: int = 6) -> list:
+        """
+        Predict for multiple images with concurrent single-image requests
+        
+        Useful when the server is replicated behind a load balancer; use
+        predict_batch_images to let a single server batch the images itself.
+        
+        Args:
+            image_paths: List of paths to image files
+            max_workers: Maximum number of requests in flight
+            
+        Returns:
+            List of prediction results, in the same order as image_paths
+        """
+        results = [None] * len(image_paths)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.predict_image_file, image_path): idx
+                for idx, image_path in enumerate(image_paths)
+            }
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        
+        return results
+    
     def get_threshold(self) -> dict:
         """Get current classification threshold"""
-        try:
-            response = self.session.get(f"{self.base_url}/threshold")
-            response.raise_for_status()
-            return {'status': 'success', 'data': response.json()}
-        except Exception as e:
-            return {'status': 'error', 'message': str(e)}
+        return self._cached_get('/threshold')
     
     def update_threshold(self, threshold: float) -> dict:
         """
@@ -150,6 +292,12 @@ class PneumoNetAPITester:
                 headers={'Content-Type': 'application/json'}
             )
             response.raise_for_status()
+            
+            # Threshold and model info changed on the server
+            self._cache.pop('/threshold', None)
+            self._cache.pop('/info', None)
+            with self._prediction_cache_lock:
+                self._prediction_cache.clear()
             return {'status': 'success', 'data': response.json()}
         except Exception as e:
             return {'status': 'error', 'message': str(e)}
@@ -173,10 +321,10 @@ class PneumoNetAPITester:
             width, height = size
             image_array = np.zeros((height, width, 3), dtype=np.uint8)
             
-            # Create a gradient pattern
-            for i in range(height):
-                image_array[i, :, 0] = int((i / height) * 255)  # Red gradient
-                image_array[i, :, 1] = int(((height - i) / height) * 255)  # Green inverse
+            # Create a gradient pattern (one value per row, broadcast across columns)
+            rows = np.arange(height)
+            image_array[..., 0] = (rows * 255 // height)[:, None]  # Red gradient
+            image_array[..., 1] = ((height - rows) * 255 // height)[:, None]  # Green inverse
             
             image = Image.fromarray(image_array)
             image.save(filename)
@@ -191,7 +339,10 @@ def print_result(title: str, result: dict):
     print(f"\n{'='*60}")
     print(f"{title}")
     print(f"{'='*60}")
-    print(json.dumps(result, indent=2))
+    if orjson is not None:
+        print(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+    else:
+        print(json.dumps(result, indent=2))
 
 
 def run_tests(base_url: str = "http://localhost:5000", test_image: str = None):
@@ -262,7 +413,52 @@ def run_tests(base_url: str = "http://localhost:5000", test_image: str = None):
     print("="*60)
 
 
+def run_in_process_tests(test_image: str = None) -> bool:
+    """
+    Exercise the base64 JSON /predict path in-process with app.test_client()
+    
+    The test client reads the body through Werkzeug's LimitedStream, as the
+    development server (python app.py) does, which a gunicorn-served
+    run_tests does not cover.
+    
+    Args:
+        test_image: Path to test image (optional)
+        
+    Returns:
+        True if the prediction succeeded
+    """
+    import app as api  # loads the model
+    
+    print("\n" + "="*60)
+    print("PneumoNet AI - In-Process Tests")
+    print("="*60)
+    
+    if test_image is None:
+        test_image = PneumoNetAPITester().create_test_image()
+    
+    with open(test_image, 'rb') as f:
+        body = b'{"image":"' + base64.b64encode(f.read()) + b'"}'
+    
+    response = api.app.test_client().post('/predict', data=body, content_type='application/json')
+    result = {
+        'status': 'success' if response.status_code == 200 else 'error',
+        'status_code': response.status_code,
+        'data': response.get_json()
+    }
+    print_result("In-Process Base64 JSON Prediction", result)
+    
+    ok = response.status_code == 200 and 'prediction' in (result['data'] or {})
+    print("\n" + ("✅ In-process base64 JSON prediction passed" if ok
+                  else "❌ In-process base64 JSON prediction failed"))
+    return ok
+
+
 if __name__ == '__main__':
+    # python test_api.py --in-process [image] runs against app.test_client()
+    if len(sys.argv) > 1 and sys.argv[1] == '--in-process':
+        test_image = sys.argv[2] if len(sys.argv) > 2 else None
+        sys.exit(0 if run_in_process_tests(test_image) else 1)
+    
     base_url = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:5000"
     test_image = sys.argv[2] if len(sys.argv) > 2 else None
     
@@ -4,9 +4,39 @@ Utility functions for image processing and model predictions
 
 import numpy as np
 from PIL import Image
+import functools
 import io
-import base64
-from typing import Tuple, Union
+from typing import List, Optional, Tuple, Union
+
+# SIMD-accelerated base64 (drop-in replacement for the stdlib module)
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# libjpeg-turbo JPEG decoding straight to a NumPy array
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
+
+def _ensure_rgb(image: Image.Image) -> Image.Image:
+    """
+    Convert to RGB only when needed; convert() always copies, even RGB to RGB
+    
+    RGB images are still loaded, as convert() would, so pixels are decoded
+    (and decode errors raised) here and the source file is closed.
+    """
+    if image.mode == 'RGB':
+        image.load()
+        return image
+    return image.convert('RGB')
 
 
 def load_image_from_path(image_path: str) -> Image.Image:
@@ -19,7 +49,48 @@ def load_image_from_path(image_path: str) -> Image.Image:
     Returns:
         PIL Image object
     """
-    return Image.open(image_path).convert('RGB')
+    return _ensure_rgb(Image.open(image_path))
+
+
+def _is_jpeg(image_bytes: bytes) -> bool:
+    """Check for the JPEG SOI marker"""
+    return image_bytes[:3] == b'\xff\xd8\xff'
+
+
+def _decode_jpeg(image_bytes: bytes) -> Optional[np.ndarray]:
+    """
+    Decode a JPEG to an RGB uint8 array with simplejpeg (libjpeg-turbo)
+    
+    Returns None for non-JPEG input, when simplejpeg is not installed, or when
+    it rejects the file (CMYK/YCCK JPEGs, recoverable corrupt-data warnings),
+    so the caller can fall back to PIL.
+    """
+    if simplejpeg is None or not _is_jpeg(image_bytes):
+        return None
+    try:
+        return simplejpeg.decode_jpeg(image_bytes, colorspace='RGB')
+    except Exception:
+        return None
+
+
+def load_array_from_bytes(image_bytes: bytes) -> np.ndarray:
+    """
+    Load an image from bytes as an RGB uint8 array
+    
+    JPEGs are decoded with simplejpeg (libjpeg-turbo) when available, skipping
+    the PIL Image entirely; other formats, and JPEGs simplejpeg cannot decode,
+    go through PIL.
+    
+    Args:
+        image_bytes: Image data as bytes
+        
+    Returns:
+        NumPy array of shape (height, width, 3)
+    """
+    pixels = _decode_jpeg(image_bytes)
+    if pixels is not None:
+        return pixels
+    return np.asarray(_ensure_rgb(Image.open(io.BytesIO(image_bytes))))
 
 
 def load_image_from_bytes(image_bytes: bytes) -> Image.Image:
@@ -32,7 +103,10 @@ def load_image_from_bytes(image_bytes: bytes) -> Image.Image:
     Returns:
         PIL Image object
     """
-    return Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    pixels = _decode_jpeg(image_bytes)
+    if pixels is not None:
+        return Image.fromarray(pixels)
+    return _ensure_rgb(Image.open(io.BytesIO(image_bytes)))
 
 
 def load_image_from_base64(image_base64: str) -> Image.Image:
@@ -45,38 +119,128 @@ def load_image_from_base64(image_base64: str) -> Image.Image:
     Returns:
         PIL Image object
     """
-    image_data = base64.b64decode(image_base64)
-    return Image.open(io.BytesIO(image_data)).convert('RGB')
+    return load_image_from_bytes(base64.b64decode(image_base64))
+
+
+def load_array_from_base64(image_base64: str) -> np.ndarray:
+    """
+    Load an image from base64 encoded string as an RGB uint8 array
+    
+    Args:
+        image_base64: Base64 encoded image string
+        
+    Returns:
+        NumPy array of shape (height, width, 3)
+    """
+    return load_array_from_bytes(base64.b64decode(image_base64))
 
 
-def image_to_base64(image: Image.Image) -> str:
+def image_to_base64(image: Image.Image, quality: int = 75) -> str:
     """
     Convert PIL Image to base64 string
     
+    Encodes with OpenCV (libjpeg-turbo) when available, otherwise with PIL.
+    
     Args:
         image: PIL Image object
+        quality: JPEG quality (1-100)
         
     Returns:
-        Base64 encoded image string
+        Base64 encoded JPEG string
     """
+    if cv2 is not None:
+        if image.mode == 'L':
+            pixels = np.asarray(image)
+        else:
+            pixels = np.asarray(_ensure_rgb(image))
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        
+        ok, buffer = cv2.imencode('.jpg', pixels, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if ok:
+            return base64.b64encode(buffer).decode('ascii')
+    
     buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
+    image.save(buffered, format="JPEG", quality=quality)
     image_bytes = buffered.getvalue()
     return base64.b64encode(image_bytes).decode('utf-8')
 
 
-def resize_image(image: Image.Image, size: Tuple[int, int] = (224, 224)) -> Image.Image:
+@functools.lru_cache(maxsize=None)
+def _load_torchvision():
+    """
+    Import torch and torchvision's encode_jpeg on first use
+    
+    Imported lazily so processes that only need the other helpers (e.g. the
+    TensorFlow API server) never load PyTorch. Returns None when unavailable.
+    """
+    try:
+        import torch
+        from torchvision.io import encode_jpeg
+    except ImportError:
+        return None
+    return torch, encode_jpeg
+
+
+def images_to_base64(images: List[Image.Image], quality: int = 75) -> List[str]:
+    """
+    Convert several PIL Images to base64 strings in one batched encode
+    
+    Uses torchvision's encode_jpeg on the whole list when available (batched
+    encoding needs torchvision >= 0.19), otherwise encodes each image with
+    image_to_base64. Grayscale images stay single-channel in both paths.
+    
+    Args:
+        images: List of PIL Image objects (sizes may differ)
+        quality: JPEG quality (1-100)
+        
+    Returns:
+        List of base64 encoded JPEG strings, in input order
+    """
+    torchvision_jpeg = _load_torchvision() if images else None
+    if torchvision_jpeg is None:
+        return [image_to_base64(image, quality) for image in images]
+    
+    torch, encode_jpeg = torchvision_jpeg
+    tensors = []
+    for image in images:
+        if image.mode == 'L':
+            pixels = torch.from_numpy(np.asarray(image)).unsqueeze(0)
+        else:
+            pixels = torch.from_numpy(np.asarray(_ensure_rgb(image))).permute(2, 0, 1)
+        tensors.append(pixels.contiguous())
+    
+    try:
+        encoded = encode_jpeg(tensors, quality=quality)
+    except TypeError:
+        # Older torchvision only encodes a single tensor per call
+        return [image_to_base64(image, quality) for image in images]
+    return [base64.b64encode(data.numpy().tobytes()).decode('ascii') for data in encoded]
+
+
+def _resize_array(image_array: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Resize a uint8 image array to (width, height) with OpenCV's area filter"""
+    return cv2.resize(image_array, size, interpolation=cv2.INTER_AREA)
+
+
+def resize_image(image: Image.Image, size: Tuple[int, int] = (224, 224),
+                 high_quality: bool = False) -> Image.Image:
     """
     Resize image to specified dimensions
     
+    Uses OpenCV's INTER_AREA filter when available (fast and alias-free for
+    downscaling), otherwise PIL's LANCZOS.
+    
     Args:
         image: PIL Image object
         size: Target size as (width, height)
+        high_quality: Always use PIL's LANCZOS filter
         
     Returns:
         Resized PIL Image
     """
-    return image.resize(size, Image.Resampling.LANCZOS)
+    if cv2 is None or high_quality or image.mode not in ('L', 'RGB'):
+        return image.resize(size, Image.Resampling.LANCZOS)
+    return Image.fromarray(_resize_array(np.asarray(image), size))
 
 
 def normalize_image(image_array: np.ndarray) -> np.ndarray:
@@ -89,33 +253,51 @@ def normalize_image(image_array: np.ndarray) -> np.ndarray:
     Returns:
         Normalized NumPy array
     """
-    return image_array.astype(np.float32) / 255.0
+    return np.multiply(image_array, np.float32(1 / 255.0), dtype=np.float32)
 
 
-def prepare_image_for_model(image: Image.Image, size: Tuple[int, int] = (224, 224)) -> np.ndarray:
+def prepare_image_for_model(image: Union[Image.Image, np.ndarray],
+                            size: Tuple[int, int] = (224, 224),
+                            high_quality: bool = False,
+                            out: Optional[np.ndarray] = None,
+                            dtype: np.dtype = np.float32) -> np.ndarray:
     """
     Prepare image for model prediction with all preprocessing steps
     
     Args:
-        image: PIL Image object
+        image: PIL Image object or RGB uint8 array (e.g. from load_array_from_bytes)
         size: Target input size
+        high_quality: Resize with PIL's LANCZOS filter instead of OpenCV
+        out: Optional preallocated array of shape (1, height, width, channels)
+             to write into, so repeated calls can reuse one buffer
+        dtype: Output dtype when out is not given; np.float16 halves the input
+               size for a mixed-precision model
         
     Returns:
-        Preprocessed image array ready for prediction
+        Preprocessed image array ready for prediction (``out`` when given)
     """
-    # Resize
-    image = resize_image(image, size)
-    
-    # Convert to array
-    image_array = np.array(image, dtype=np.float32)
+    if isinstance(image, np.ndarray) and (cv2 is None or high_quality):
+        image = Image.fromarray(image)
     
-    # Normalize
-    image_array = normalize_image(image_array)
+    if isinstance(image, np.ndarray):
+        image_array = _resize_array(image, size)
+    else:
+        # Decode up front so np.asarray views the loaded pixels instead of
+        # triggering a lazy decode inside the array conversion
+        image.load()
+        
+        # Resize (on the raw array with OpenCV, skipping the PIL round-trip)
+        if cv2 is None or high_quality or image.mode not in ('L', 'RGB'):
+            image_array = np.asarray(resize_image(image, size, high_quality=True))
+        else:
+            image_array = _resize_array(np.asarray(image), size)
     
-    # Add batch dimension
-    image_array = np.expand_dims(image_array, axis=0)
+    # Cast, normalize and add the batch dimension in a single pass
+    if out is None:
+        out = np.empty((1,) + image_array.shape, dtype=dtype)
+    np.multiply(image_array, np.float32(1 / 255.0), out=out[0])
     
-    return image_array
+    return out
 
 
 def format_prediction_response(prediction: float, threshold: float = 0.5, 
@@ -144,18 +326,70 @@ def format_prediction_response(prediction: float, threshold: float = 0.5,
     }
 
 
-def validate_image(image: Image.Image, min_size: int = 50) -> Tuple[bool, str]:
+def format_prediction_responses(predictions: np.ndarray, threshold: float = 0.5,
+                                filenames: Optional[List[str]] = None) -> List[dict]:
+    """
+    Format a batch of model predictions into readable responses
+    
+    Vectorized form of format_prediction_response: rounding, class selection
+    and confidence are computed once over the whole array.
+    
+    Args:
+        predictions: Raw prediction values from model, one per image
+        threshold: Threshold for classification
+        filenames: Names of the input files, in prediction order
+        
+    Returns:
+        List of formatted prediction dictionaries
+    """
+    confidences = np.asarray(predictions, dtype=np.float64).reshape(-1)
+    if filenames is None:
+        filenames = ['unknown'] * len(confidences)
+    
+    normal = 1 - confidences
+    pneumonia_probabilities = np.round(confidences, 4).tolist()
+    normal_probabilities = np.round(normal, 4).tolist()
+    predicted_classes = np.where(confidences > threshold, 'PNEUMONIA', 'NORMAL').tolist()
+    scores = np.round(np.maximum(confidences, normal) * 100, 2).tolist()
+    
+    return [
+        {
+            'filename': filename,
+            'pneumonia_probability': pneumonia_probability,
+            'normal_probability': normal_probability,
+            'predicted_class': predicted_class,
+            'confidence': score,
+            'threshold_used': threshold
+        }
+        for filename, pneumonia_probability, normal_probability, predicted_class, score
+        in zip(filenames, pneumonia_probabilities, normal_probabilities, predicted_classes, scores)
+    ]
+
+
+def validate_image(image: Union[Image.Image, bytes], min_size: int = 50) -> Tuple[bool, str]:
     """
     Validate image for prediction
     
+    Raw bytes are checked from the image header alone, so undersized or
+    unreadable uploads are rejected before any pixel decoding.
+    
     Args:
-        image: PIL Image object
+        image: PIL Image object or raw encoded image bytes
         min_size: Minimum image dimension
         
     Returns:
         Tuple of (is_valid, message)
     """
-    if image.width < min_size or image.height < min_size:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        try:
+            with Image.open(io.BytesIO(image)) as header:
+                width, height = header.size
+        except Exception:
+            return False, "Invalid image"
+    else:
+        width, height = image.size
+    
+    if width < min_size or height < min_size:
         return False, f"Image too small. Minimum size: {min_size}x{min_size}"
     
     return True, "Image valid"